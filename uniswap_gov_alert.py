@@ -11,7 +11,8 @@ Uniswap Governance → Telegram alert bot (local test version).
     FORCE_LATEST        - "true"/"1"/"yes" to send a test alert for latest topic
 
 Normal mode:
-    - Tracks last_seen topic ID in uniswap_last_seen.json
+    - Tracks last_seen topic ID in uniswap_last_seen.bin, along with the
+      category's ETag / Last-Modified for conditional (304) fetches
     - Sends alerts only for topics with id > last_seen
 
 Test mode (FORCE_LATEST=true):
@@ -19,71 +20,282 @@ Test mode (FORCE_LATEST=true):
     - Does NOT modify the state file
 """
 
+import asyncio
 import os
-import json
-import requests
-from typing import Dict, Any, List
+import random
+import struct
+import httpx
+import ijson
+import orjson
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, Iterable, Iterator, List, Optional, Tuple
 
 # ---- Config ----
 
 UNISWAP_FORUM_NAME = "Uniswap Proposal Discussion"
 UNISWAP_CATEGORY_JSON = "https://gov.uniswap.org/c/proposal-discussion/5.json"
 UNISWAP_BASE_URL = "https://gov.uniswap.org"
-STATE_FILE = "uniswap_last_seen.json"
+STATE_FILE = "uniswap_last_seen.bin"
+# last_topic_id, ETag, Last-Modified; the strings are NUL-padded
+STATE_ETAG_SIZE = 128
+STATE_LAST_MODIFIED_SIZE = 64
+STATE_STRUCT = struct.Struct(f"<Q{STATE_ETAG_SIZE}s{STATE_LAST_MODIFIED_SIZE}s")
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 FORCE_LATEST = os.getenv("FORCE_LATEST", "").lower() in ("1", "true", "yes")
 
+TELEGRAM_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+TELEGRAM_BASE_PAYLOAD = {
+    "chat_id": TELEGRAM_CHAT_ID,
+    # all dynamic text is escaped with MD_ESCAPE before it goes in a message
+    "parse_mode": "MarkdownV2",
+}
+TELEGRAM_HEADERS = {"Content-Type": "application/json"}
+
+# Characters MarkdownV2 reserves; escaped in one str.translate pass
+MD_ESCAPE = str.maketrans({c: "\\" + c for c in "\\_*[]()~`>#+-=|{}.!"})
+
+ALERT_HEADER = "*New Uniswap governance thread*"
+ALERT_HEADER_PLURAL = "*New Uniswap governance threads*"
+ALERT_LINE_TEMPLATE = "• {title}\n{url}"
+TEST_ALERT_TEMPLATE = "*\\[TEST\\] Latest topic on {forum}*\n{title}\n{url}"
+
+# Telegram caps messages at 4096 chars; leave headroom for the header
+TELEGRAM_MAX_MESSAGE_CHARS = 3800
+# Pause between messages in big bursts to stay under Telegram's 30 msg/s
+TELEGRAM_BURST_MESSAGES = 30
+TELEGRAM_BURST_DELAY = 0.05
+
+HTTP_TIMEOUT = 15.0
+HTTP_POOL_SIZE = 4
+HTTP_RETRIES = 5
+HTTP_BACKOFF = 1.0
+HTTP_MAX_BACKOFF = 30.0
+# Give up rather than wait out a longer 429 (e.g. a flood-control ban)
+HTTP_MAX_RETRY_AFTER = 60.0
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Only these fields of each topic are used; everything else is skipped
+# while streaming the category JSON.
+TOPIC_PREFIX = "topic_list.topics.item"
+TOPIC_FIELDS = {f"{TOPIC_PREFIX}.{k}": k for k in ("id", "title", "slug")}
+TOPIC_ID_PREFIX = f"{TOPIC_PREFIX}.id"
+
 
 # ---- Helpers ----
 
-def send_telegram(text: str) -> None:
-    """Send a Telegram message using the bot token & chat ID from env vars."""
-    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
-        raise RuntimeError("TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID not set")
+def make_client() -> httpx.AsyncClient:
+    """
+    Create the shared HTTP client.
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": TELEGRAM_CHAT_ID,
-        "text": text,
-        # no parse_mode → plain text, less likely to error
-    }
-    r = requests.post(url, json=payload, timeout=15)
-    print("Telegram response:", r.status_code, r.text)  # debug line
-    r.raise_for_status()
+    HTTP/2 lets consecutive requests to a host share one multiplexed
+    connection (one TLS handshake) instead of queueing on HTTP/1.1.
+    """
+    limits = httpx.Limits(
+        max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE
+    )
+    return httpx.AsyncClient(http2=True, timeout=HTTP_TIMEOUT, limits=limits)
+
+
+class AsyncByteReader:
+    """Minimal async file-like view of a streamed response, for ijson."""
+
+    def __init__(self, r: httpx.Response) -> None:
+        self._chunks = r.aiter_bytes()
+
+    async def read(self, size: int = -1) -> bytes:
+        # ijson probes with read(0) and treats b"" as EOF, so skip empty
+        # chunks from the stream; size is otherwise ignored
+        if size == 0:
+            return b""
+        async for chunk in self._chunks:
+            if chunk:
+                return chunk
+        return b""
+
+
+async def retry_after_seconds(r: httpx.Response) -> Optional[float]:
+    """Read the wait requested by a 429, from Telegram's body or the header."""
+    try:
+        body = orjson.loads(await r.aread())
+        retry_after = body.get("parameters", {}).get("retry_after")
+    except (ValueError, AttributeError, httpx.HTTPError):
+        retry_after = None
+    if retry_after is None:
+        retry_after = r.headers.get("Retry-After")
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except ValueError:
+        return None
+
+
+@asynccontextmanager
+async def request_with_retry(
+    client: httpx.AsyncClient, method: str, url: str, **kwargs: Any
+) -> AsyncIterator[httpx.Response]:
+    """
+    Issue a request, retrying on 429/5xx responses.
 
+    429s wait for the requested retry_after / Retry-After; other retryable
+    statuses (or a 429 without a hint) use exponential backoff with jitter.
+    Yields the streamed (unread) response of the last attempt and closes it
+    on exit.
+    """
+    request = client.build_request(method, url, **kwargs)
+    attempt = 0
+    while True:
+        r = await client.send(request, stream=True)
+        if r.status_code not in HTTP_RETRY_STATUSES or attempt >= HTTP_RETRIES:
+            break
+
+        delay = None
+        if r.status_code == 429:
+            delay = await retry_after_seconds(r)
+            if delay is not None and delay > HTTP_MAX_RETRY_AFTER:
+                break
+        if delay is None:
+            delay = min(HTTP_BACKOFF * (2 ** attempt) + random.random(), HTTP_MAX_BACKOFF)
+        await r.aclose()
+
+        # don't log the URL: the Telegram one embeds the bot token
+        print(f"{method} returned {r.status_code}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+        attempt += 1
+
+    try:
+        yield r
+    finally:
+        await r.aclose()
+
+
+async def send_telegram(client: httpx.AsyncClient, text: str) -> None:
+    """Send a Telegram message using the bot token & chat ID from env vars."""
+    payload = {**TELEGRAM_BASE_PAYLOAD, "text": text}
+    async with request_with_retry(
+        client,
+        "POST",
+        TELEGRAM_URL,
+        content=orjson.dumps(payload),
+        headers=TELEGRAM_HEADERS,
+    ) as r:
+        await r.aread()
+        print("Telegram response:", r.status_code, r.text)  # debug line
+        r.raise_for_status()
+
+
+async def fetch_uniswap_topics(
+    client: httpx.AsyncClient,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str], Optional[str]]:
+    """
+    Fetch topics from the Uniswap Proposal Discussion category.
 
+    The request is conditional on the given ETag / Last-Modified validators.
+    Returns (topics, etag, last_modified) with the validators of the
+    response; topics is None if the category is unchanged (HTTP 304).
 
-def fetch_uniswap_topics() -> List[Dict[str, Any]]:
-    """Fetch topics from the Uniswap Proposal Discussion category."""
-    r = requests.get(UNISWAP_CATEGORY_JSON, timeout=15)
-    r.raise_for_status()
-    data = r.json()
-    topics = data.get("topic_list", {}).get("topics", [])
-    # ensure newest-first
-    topics.sort(key=lambda t: t["id"], reverse=True)
-    return topics
+    The response is stream-parsed and only id/title/slug are kept per topic,
+    so posters, tags, excerpts etc. are never materialized.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    topics: List[Dict[str, Any]] = []
+    topic: Dict[str, Any] = {}
+    async with request_with_retry(
+        client, "GET", UNISWAP_CATEGORY_JSON, headers=headers
+    ) as r:
+        if r.status_code == 304:
+            return None, etag, last_modified
+        r.raise_for_status()
+        etag = r.headers.get("ETag")
+        last_modified = r.headers.get("Last-Modified")
+        async for prefix, event, value in ijson.parse_async(AsyncByteReader(r)):
+            if prefix in TOPIC_FIELDS:
+                topic[TOPIC_FIELDS[prefix]] = value
+            elif prefix == TOPIC_PREFIX and event == "end_map":
+                topics.append(topic)
+                topic = {}
+    # Discourse order (pinned first, then by activity) is kept as-is;
+    # callers that need id order only look at max ids or new topics.
+    return topics, etag, last_modified
+
+
+def _pack_header(value: Optional[str], size: int) -> bytes:
+    """Encode a validator for the state file, dropping it if it won't fit."""
+    raw = (value or "").encode()
+    return raw if len(raw) <= size else b""
+
+
+def _unpack_header(raw: bytes) -> Optional[str]:
+    return raw.rstrip(b"\0").decode() or None
+
+
+async def fetch_max_topic_id(
+    client: httpx.AsyncClient,
+) -> Tuple[int, Optional[str], Optional[str]]:
+    """
+    Return (max topic id, ETag, Last-Modified) for the category.
+
+    Only the topic ids are read off the stream; no per-topic dicts are built.
+    """
+    max_id = 0
+    async with request_with_retry(client, "GET", UNISWAP_CATEGORY_JSON) as r:
+        r.raise_for_status()
+        async for prefix, _, value in ijson.parse_async(AsyncByteReader(r)):
+            if prefix == TOPIC_ID_PREFIX and value > max_id:
+                max_id = value
+        return max_id, r.headers.get("ETag"), r.headers.get("Last-Modified")
 
 
-def load_last_seen(path: str) -> int:
-    """Load the last seen topic id from a JSON file, or 0 if not present."""
-    if not os.path.exists(path):
-        return 0
-    with open(path, "r") as f:
-        obj = json.load(f)
-    return int(obj.get("last_topic_id", 0))
+def load_last_seen(path: str) -> Optional[Tuple[int, Optional[str], Optional[str]]]:
+    """
+    Load (last seen topic id, ETag, Last-Modified) from the binary state file.
 
+    Returns None if the file is not present, i.e. on the first run.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read(STATE_STRUCT.size)
+    except FileNotFoundError:
+        return None
+    topic_id, etag, last_modified = STATE_STRUCT.unpack(data)
+    return topic_id, _unpack_header(etag), _unpack_header(last_modified)
+
+
+def save_last_seen(
+    path: str,
+    topic_id: int,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> None:
+    """
+    Save the last seen topic id and category validators to the state file.
 
-def save_last_seen(path: str, topic_id: int) -> None:
-    """Save the last seen topic id to a JSON file."""
-    with open(path, "w") as f:
-        json.dump({"last_topic_id": int(topic_id)}, f)
+    Written to a temp file and renamed over the old one, so a crash never
+    leaves a truncated state file behind.
+    """
+    data = STATE_STRUCT.pack(
+        int(topic_id),
+        _pack_header(etag, STATE_ETAG_SIZE),
+        _pack_header(last_modified, STATE_LAST_MODIFIED_SIZE),
+    )
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
 
 
 # ---- Core logic ----
 
-def run_force_latest(topics: List[Dict[str, Any]]) -> None:
+async def run_force_latest(
+    client: httpx.AsyncClient, topics: List[Dict[str, Any]]
+) -> None:
     """
     Test mode: ignore state and send an alert for the newest topic.
 
@@ -93,73 +305,161 @@ def run_force_latest(topics: List[Dict[str, Any]]) -> None:
         print("No topics found on Uniswap forum (force_latest).")
         return
 
-    latest = topics[0]
-    title = latest["title"]
-    slug = latest["slug"]
+    latest = max(topics, key=lambda t: t["id"])
     topic_id = latest["id"]
-    url = f"{UNISWAP_BASE_URL}/t/{slug}/{topic_id}"
+    url = f"{UNISWAP_BASE_URL}/t/{latest['slug']}/{topic_id}"
 
-    msg = (
-        f"*[TEST]* Latest topic on {UNISWAP_FORUM_NAME}*\n"
-        f"{title}\n"
-        f"{url}"
+    msg = TEST_ALERT_TEMPLATE.format(
+        forum=UNISWAP_FORUM_NAME.translate(MD_ESCAPE),
+        title=latest["title"].translate(MD_ESCAPE),
+        url=url.translate(MD_ESCAPE),
     )
     print(f"Sending test Telegram alert for topic ID {topic_id}")
-    send_telegram(msg)
+    await send_telegram(client, msg)
 
 
-def run_normal(topics: List[Dict[str, Any]], state_path: str) -> None:
-    """Normal mode: track new topics since last_seen and alert on them."""
-    if not topics:
+def new_alert_lines(
+    topics: List[Dict[str, Any]], last_seen: int
+) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (topic id, alert line) for topics newer than last_seen, oldest first.
+
+    Discourse doesn't list topics in id order (pinned first, then by
+    activity), so the new ones are sorted; in the usual case that's a
+    handful of topics, not the whole category.
+    """
+    new_topics = sorted(
+        (t for t in topics if t["id"] > last_seen), key=lambda t: t["id"]
+    )
+    for t in new_topics:
+        tid = t["id"]
+        url = f"{UNISWAP_BASE_URL}/t/{t['slug']}/{tid}"
+        yield tid, ALERT_LINE_TEMPLATE.format(
+            title=t["title"].translate(MD_ESCAPE), url=url.translate(MD_ESCAPE)
+        )
+
+
+def build_alert_messages(alerts: Iterable[Tuple[int, str]]) -> List[Tuple[int, str]]:
+    """
+    Pack (topic id, alert line) pairs into as few messages as fit.
+
+    Returns (max topic id in message, text) pairs, in input order.
+    """
+    messages: List[Tuple[int, str]] = []
+    lines: List[str] = []
+    size = 0
+    last_id = 0
+
+    def flush() -> None:
+        header = ALERT_HEADER_PLURAL if len(lines) > 1 else ALERT_HEADER
+        messages.append((last_id, header + "\n\n" + "\n\n".join(lines)))
+
+    for tid, line in alerts:
+        if lines and size + len(line) + 2 > TELEGRAM_MAX_MESSAGE_CHARS:
+            flush()
+            lines = []
+            size = 0
+        lines.append(line)
+        size += len(line) + 2
+        last_id = tid
+
+    if lines:
+        flush()
+    return messages
+
+
+async def run_first(client: httpx.AsyncClient, state_path: str) -> None:
+    """
+    First run: initialize last_seen to the current max id to avoid spam.
+
+    The category is still scanned in full, since Discourse lists pinned
+    topics first and the rest by activity, so the newest id can be anywhere.
+    """
+    max_id, etag, last_modified = await fetch_max_topic_id(client)
+    if not max_id:
         print("No topics found on Uniswap forum.")
         return
+    save_last_seen(state_path, max_id, etag, last_modified)
+    print(f"Initialized last_seen to {max_id}, no alerts sent on first run.")
+
 
-    if not os.path.exists(state_path):
-        # First run: initialize last_seen to the current max id to avoid spam
-        max_id = max(t["id"] for t in topics)
-        save_last_seen(state_path, max_id)
-        print(f"Initialized last_seen to {max_id}, no alerts sent on first run.")
+async def run_normal(
+    client: httpx.AsyncClient,
+    state_path: str,
+    state: Tuple[int, Optional[str], Optional[str]],
+) -> None:
+    """Normal mode: track new topics since last_seen and alert on them.
+
+    The category fetch is conditional on the ETag / Last-Modified stored with
+    last_seen, so unchanged categories cost a single 304 and no parsing.
+
+    New topics are batched into as few Telegram messages as fit, sent in
+    order; last_seen only advances past messages that were delivered, so a
+    failed message (and anything after it) is retried on the next run.
+    """
+    last_seen, old_etag, old_last_modified = state
+
+    topics, etag, last_modified = await fetch_uniswap_topics(
+        client, old_etag, old_last_modified
+    )
+    if topics is None:
+        print(f"Category not modified since last run (last_seen={last_seen}).")
+        return
+
+    if not topics:
+        print("No topics found on Uniswap forum.")
         return
 
-    last_seen = load_last_seen(state_path)
-    new_topics = [t for t in topics if t["id"] > last_seen]
+    messages = build_alert_messages(new_alert_lines(topics, last_seen))
 
-    if not new_topics:
+    if not messages:
+        if (etag, last_modified) != (old_etag, old_last_modified):
+            save_last_seen(state_path, last_seen, etag, last_modified)
         print(f"No new topics since last_seen={last_seen}.")
         return
 
-    # oldest→newest for clean chronological alerts
-    new_topics_sorted = sorted(new_topics, key=lambda t: t["id"])
-
-    for t in new_topics_sorted:
-        title = t["title"]
-        slug = t["slug"]
-        topic_id = t["id"]
-        url = f"{UNISWAP_BASE_URL}/t/{slug}/{topic_id}"
+    print(
+        f"Sending {len(messages)} Telegram alert(s) for new topics up to "
+        f"ID {messages[-1][0]}"
+    )
 
-        msg = (
-            f"*New Uniswap governance thread*\n"
-            f"{title}\n"
-            f"{url}"
-        )
-        print(f"Sending Telegram alert for new topic ID {topic_id}")
-        send_telegram(msg)
+    for i, (topic_id, msg) in enumerate(messages):
+        if i and len(messages) > TELEGRAM_BURST_MESSAGES:
+            await asyncio.sleep(TELEGRAM_BURST_DELAY)
+        await send_telegram(client, msg)
         last_seen = topic_id
 
-    save_last_seen(state_path, last_seen)
-    print(f"Updated last_seen to {last_seen}.")
+        # Checkpoint after every delivered message. The new validators are
+        # only stored once all alerts are out: until then the next run must
+        # refetch the category rather than get a 304 and drop what's left.
+        if i == len(messages) - 1:
+            save_last_seen(state_path, last_seen, etag, last_modified)
+        else:
+            save_last_seen(state_path, last_seen, old_etag, old_last_modified)
+        print(f"Updated last_seen to {last_seen}.")
 
 
-def main() -> None:
-    topics = fetch_uniswap_topics()
+async def main() -> None:
+    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+        raise RuntimeError("TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID not set")
+
+    # One client for the Discourse fetch and every Telegram send, so
+    # connections (and their TLS handshakes) are shared across requests.
+    async with make_client() as client:
+        if FORCE_LATEST:
+            print("Running in FORCE_LATEST (test) mode.")
+            topics, _, _ = await fetch_uniswap_topics(client)
+            await run_force_latest(client, topics or [])
+            return
 
-    if FORCE_LATEST:
-        print("Running in FORCE_LATEST (test) mode.")
-        run_force_latest(topics)
-    else:
-        print("Running in normal mode.")
-        run_normal(topics, STATE_FILE)
+        state = load_last_seen(STATE_FILE)
+        if state is None:
+            print("Running in first-run mode.")
+            await run_first(client, STATE_FILE)
+        else:
+            print("Running in normal mode.")
+            await run_normal(client, STATE_FILE, state)
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())